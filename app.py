@@ -1,33 +1,50 @@
 # Import required libraries
 
 import os                            # Provides file system and environment variable utilities
+import json                          # Encodes streamed text pieces safely for Server-Sent Events
 from dotenv import load_dotenv       # Loads variables from a .env file into the environment
 
-# Load environment variables (like TEMP_FOLDER, model names, etc.)
+# Load environment variables (like CHROMA_PATH, model names, etc.)
 load_dotenv()
 
-from flask import Flask, request, jsonify   # Flask is the lightweight web framework for creating APIs
+from flask import Flask, Response, request, jsonify   # Flask is the lightweight web framework for creating APIs
+from flask_compress import Compress         # Compresses responses (Brotli/gzip) when the client supports it
 
 # Import custom modules from this project
 # Each of these scripts defines specific functionality for embedding, querying, and vector DB setup
 from embed import embed
-from query import query
+from query import query, query_stream, warm_up
 from get_vector_db import get_vector_db
 
 # Setup and configuration
 
-# TEMP_FOLDER is used to store temporary uploads during the embedding process.
-# If not specified in the .env file, it defaults to './_temp'
-TEMP_FOLDER = os.getenv('TEMP_FOLDER', './_temp')
-
-# Ensure that the temporary folder actually exists on the file system.
-# 'exist_ok=True' means it won’t raise an error if the folder already exists.
-os.makedirs(TEMP_FOLDER, exist_ok=True)
-
 # Create the Flask application object.
 # This acts as the main web server for local RAG system.
 app = Flask(__name__)
 
+# Response size settings
+# - compact JSON: no indentation or extra spaces (Flask pretty-prints in debug mode otherwise)
+# - Compress: Brotli first (best ratio on JSON text), falling back to gzip
+app.json.compact = True
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+Compress(app)
+
+# Warm-up
+# Load the LLM, embedding model, and vector index once at startup, so the first
+# request doesn't pay the model-loading cost. Set WARMUP=0 to skip (e.g., when Ollama
+# isn't running yet). A failure here is logged but doesn't stop the server.
+#
+# This is called explicitly at server start (gunicorn's post_worker_init hook, or the
+# __main__ block below), never at import: the PDF worker processes re-import the main
+# module, and they must not load models.
+
+def startup_warm_up():
+    if os.getenv('WARMUP', '1') == '1':
+        try:
+            warm_up()
+        except Exception as e:
+            app.logger.warning("Warm-up failed: %s", e)
+
 # API ROUTE 1: Embed endpoint
 # Purpose: Accepts a PDF file, processes it into embeddings,
 # and stores those embeddings into ChromaDB.
@@ -78,13 +95,39 @@ def route_query():
     return jsonify({"error": "Something went wrong"}), 400
 
 
-# Run the Flask app
+# API ROUTE 3: Streaming query endpoint
+# Purpose: Same as /query, but streams the answer as Server-Sent Events while the
+# LLM is still generating it. Each event's data is a JSON-encoded text piece
+# (JSON keeps newlines inside the text from breaking the event format).
+# The buffered /query endpoint above stays available for simple clients.
+
+@app.route('/query/stream', methods=['POST'])
+def route_query_stream():
+    data = request.get_json()
+    question = data.get('query')
+
+    if not question:
+        return jsonify({"error": "No query provided"}), 400
+
+    def generate():
+        for piece in query_stream(question):
+            yield f"data: {json.dumps(piece)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
+
+# Run the Flask app (development only)
+# For normal use, serve the app with gunicorn instead (see gunicorn.conf.py):
+#   gunicorn app:app
+#
 # host="0.0.0.0" means it’s accessible from any device on your local network.
-# debug=True enables live reload and helpful error messages for development.
+# Debug mode (live reload, stack traces) is only enabled when FLASK_ENV=dev,
+# because the reloader restarts the process and rebuilds every cached model and index.
 # Port 8080 is the same endpoint used in curl examples.
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8080, debug=True)
+    startup_warm_up()
+    app.run(host="0.0.0.0", port=8080, debug=os.getenv('FLASK_ENV') == 'dev')
 
 
 '''
@@ -96,5 +139,9 @@ embed() and query() are decoupled — the API is only responsible for communicat
 
 The structure mirrors real-world API design patterns (request validation → core logic → structured JSON response).
 
-Running the app with debug=True helps you see stack traces in real time.
+Running the app with FLASK_ENV=dev turns on debug mode, which helps you see stack traces in real time.
+
+In normal use the app runs under gunicorn in one process with a thread pool, so /embed and /query requests are served concurrently.
+
+Responses are sent as compact JSON and compressed with Brotli or gzip, which keeps long LLM answers small over the network.
 '''
\ No newline at end of file
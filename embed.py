@@ -1,17 +1,58 @@
 # Imports
 
+import io                                                 # Wraps the uploaded bytes as an in-memory file
 import os
-from datetime import datetime
-from werkzeug.utils import secure_filename                # Helps sanitize uploaded file names
-from langchain_community.document_loaders import UnstructuredPDFLoader
+import hashlib                                            # Fingerprints uploaded files to detect duplicates
+import threading                                          # Guards the shared process pool and in-progress uploads
+import multiprocessing                                    # Provides the 'forkserver'/'spawn' start methods for PDF workers
+from uuid import uuid4                                    # Generates unique IDs for stored chunks
+from concurrent.futures import (                          # Parallel parsing and writes
+    ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_EXCEPTION
+)
+from pypdf import PdfReader, PdfWriter                    # Counts pages and splits large PDFs into page batches
+from langchain_core.documents import Document             # LangChain's text + metadata container
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from get_vector_db import get_vector_db                   # Custom helper to connect to ChromaDB
+from pdf_pages import extract_pages                       # Lightweight text extraction run in worker processes
+from get_vector_db import (                               # Custom helpers to connect to and save the vector DB
+    get_vector_db, get_embedding, persist_vector_db, rebuild_bm25_retriever,
+    VECTOR_BACKEND, EMBEDDING_BACKEND, DB_WRITE_LOCK
+)
+from query_cache import QUERY_CACHE                       # Cached answers must be dropped once new documents arrive
 
 # Configuration
 
-# TEMP_FOLDER defines where uploaded files are stored before being processed.
-# If it's not set in .env, the default is './_temp'.
-TEMP_FOLDER = os.getenv('TEMP_FOLDER', './_temp')
+# Number of pages handed to each worker process when parsing a PDF in parallel.
+PAGES_PER_BATCH = 5
+
+# PDFs shorter than this are sent to a worker as one piece; splitting isn't worth it.
+MIN_PARALLEL_PAGES = 8
+
+# Number of PDF worker processes, shared by all uploads (so concurrent uploads can't
+# multiply the process count).
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(os.cpu_count() or 1)))
+
+# Chunks embedded and written to the vector store per batch.
+WRITE_BATCH_SIZE = 256
+
+# Maximum number of batches being embedded at the same time.
+WRITE_WORKERS = 5
+
+# Shared PDF process pool, created on first use
+_PDF_POOL = None
+_PDF_POOL_LOCK = threading.Lock()
+
+# Hashes of files currently being embedded by some request thread.
+# Uploads of the same file wait on this condition until the first one has finished.
+_IN_PROGRESS_HASHES = set()
+_IN_PROGRESS = threading.Condition()
+
+# Tokenizer used only by the text splitter, created on first use
+_SPLITTER_TOKENIZER = None
+_SPLITTER_TOKENIZER_LOCK = threading.Lock()
+
+# Hashes of the documents stored in the FAISS index, loaded once and then kept up to date,
+# so duplicate checks don't scan the whole docstore on every upload
+_FAISS_HASHES = None
 
 # Helper function: File validation
 # Checks that the uploaded file has an extension and that it is a PDF.
@@ -21,78 +62,347 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'pdf'}
 
 
-# Helper function: Save uploaded file
-# Saves the uploaded PDF temporarily on disk before it’s processed.
-# Adds a timestamp prefix to avoid filename collisions.
-# The use of 'secure_filename' prevents directory traversal or unsafe file names.
+# Helper function: Read uploaded file
+# Reads the uploaded PDF into memory and fingerprints it with BLAKE2b.
+# The upload is never written to disk: parsing works straight from these bytes, which
+# saves a full write + read of the file and keeps untrusted uploads off the file system.
+# BLAKE2b runs at around 1 GB/s, so hashing costs far less than parsing the PDF.
+
+def read_upload(file):
+    pdf_bytes = file.stream.read()
+    doc_hash = hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+    return pdf_bytes, doc_hash
+
 
-def save_file(file):
-    # Generate a unique timestamped filename
-    ct = datetime.now()
-    ts = ct.timestamp()
-    filename = str(ts) + "_" + secure_filename(file.filename)
+# Helper function: Known FAISS document hashes
+# Built from the docstore on first use. The scan holds DB_WRITE_LOCK, so it can't run
+# while another upload is adding chunks.
 
-    # Build the full path inside the temporary directory
-    file_path = os.path.join(TEMP_FOLDER, filename)
+def faiss_hashes(db):
+    global _FAISS_HASHES
 
-    # Save the uploaded file to disk
-    file.save(file_path)
+    with DB_WRITE_LOCK:
+        if _FAISS_HASHES is None:
+            _FAISS_HASHES = {doc.metadata.get('doc_hash') for doc in db.docstore._dict.values()}
+        return _FAISS_HASHES
 
-    # Return the path so it can be loaded later
-    return file_path
+
+# Helper function: Check whether a file was already embedded
+# Every stored chunk carries its source file's hash in metadata['doc_hash'].
+
+def is_already_embedded(db, doc_hash):
+    if VECTOR_BACKEND == 'faiss':
+        return doc_hash in faiss_hashes(db)
+
+    return bool(db.get(where={'doc_hash': doc_hash}, limit=1)['ids'])
+
+
+# Helper function: Claim a file for embedding
+# Makes "is it already stored?" and "I'm embedding it" a single atomic step.
+# If another request is embedding the same file right now, this waits for it to finish:
+#   - it succeeded → the file is stored, so return False (nothing to do)
+#   - it failed    → the file is not stored, so this request claims it and tries again
+# Returns True if the caller now owns the upload and must call release_upload() after.
+
+def claim_upload(db, doc_hash):
+    with _IN_PROGRESS:
+        while doc_hash in _IN_PROGRESS_HASHES:
+            _IN_PROGRESS.wait()
+
+        if is_already_embedded(db, doc_hash):
+            return False
+
+        _IN_PROGRESS_HASHES.add(doc_hash)
+        return True
+
+
+# Helper function: Release a claimed file
+# Called once the upload has finished (stored or failed), waking any duplicate uploads.
+
+def release_upload(doc_hash):
+    with _IN_PROGRESS:
+        _IN_PROGRESS_HASHES.discard(doc_hash)
+        _IN_PROGRESS.notify_all()
+
+
+# Helper function: Get the shared PDF process pool
+# One bounded pool serves every upload.
+# Workers are started with 'forkserver', not 'fork': this process runs several threads and
+# holds torch, Chroma and SQLite state, and forking it could deadlock the child.
+# The fork server preloads only pdf_pages, which imports nothing but pypdf.
+# Windows has no 'forkserver', so there workers are started with 'spawn' (slower to
+# start, but equally safe).
+
+def get_pdf_pool():
+    global _PDF_POOL
+
+    if _PDF_POOL is None:
+        with _PDF_POOL_LOCK:
+            if _PDF_POOL is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['pdf_pages'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                _PDF_POOL = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=context)
+
+    return _PDF_POOL
+
+
+# Helper function: Parse a PDF across multiple processes
+# Text extraction is CPU-bound, so a single thread leaves most cores idle.
+# This helper:
+#   1. Counts the pages with pypdf.
+#   2. Copies every group of PAGES_PER_BATCH pages into its own in-memory sub-PDF.
+#   3. Extracts the sub-PDFs concurrently in the shared process pool (bypassing the GIL).
+#   4. Reassembles the pages in original order, one Document per page.
+# Scanned pages are OCR'd by the worker that extracts them (see pdf_pages.py).
+# Short PDFs go to a single worker in one piece.
+
+def parallel_load(pdf_bytes, source):
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    num_pages = len(reader.pages)
+
+    # Small documents: one batch holding the whole file
+    if num_pages < MIN_PARALLEL_PAGES:
+        batches = [(pdf_bytes, 0)]
+    else:
+        # Build each page batch as its own small PDF, held in memory
+        batches = []
+        for start in range(0, num_pages, PAGES_PER_BATCH):
+            writer = PdfWriter()
+            for page_index in range(start, min(start + PAGES_PER_BATCH, num_pages)):
+                writer.add_page(reader.pages[page_index])
+
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            batches.append((buffer.getvalue(), start))
+
+    # Extract batches concurrently, then restore page order
+    pages = []
+    futures = [get_pdf_pool().submit(extract_pages, batch, start) for batch, start in batches]
+    for future in as_completed(futures):
+        pages.extend(future.result())
+    pages.sort()
+
+    return [
+        Document(page_content=text, metadata={'source': source, 'page': page_number})
+        for page_number, text in pages
+        if text.strip()
+    ]
+
+
+# Helper function: Get the splitter's own tokenizer
+# The splitter must not share the embedding model's tokenizer. Counting tokens switches
+# truncation and padding off on the underlying Rust tokenizer, and every encode() switches
+# them back on. With uploads and queries running on several threads, those changes collide
+# and fail with "RuntimeError: Already borrowed".
+# This copy is loaded once, and tokenized once under the lock so its truncation/padding
+# settings are fixed before any concurrent use.
+
+def get_splitter_tokenizer(model):
+    global _SPLITTER_TOKENIZER
+
+    if _SPLITTER_TOKENIZER is None:
+        with _SPLITTER_TOKENIZER_LOCK:
+            if _SPLITTER_TOKENIZER is None:
+                # Imported here so transformers is only loaded for the local embedding model
+                from transformers import AutoTokenizer
+
+                tokenizer = AutoTokenizer.from_pretrained(model.tokenizer.name_or_path)
+                tokenizer.tokenize('warmup')
+                _SPLITTER_TOKENIZER = tokenizer
+
+    return _SPLITTER_TOKENIZER
+
+
+# Helper function: Build the text splitter
+# Small chunks retrieve more precisely and fill embedding batches evenly.
+#
+# With the local SentenceTransformer, chunks are measured in the model's own tokens,
+# so each chunk fits its input window (max_seq_length, 256 tokens for all-MiniLM-L6-v2)
+# instead of being silently truncated. The splitter counts text tokens only, so two are
+# reserved for the [CLS] and [SEP] tokens the model adds to every input.
+# Tokens are counted with a separate copy of the model's tokenizer (see above).
+# With Ollama embeddings, chunks are measured in characters.
+
+def get_text_splitter():
+    if EMBEDDING_BACKEND != 'ollama':
+        model = get_embedding().model
+        return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            get_splitter_tokenizer(model),
+            chunk_size=model.max_seq_length - 2,    # Fill the model's input window, minus [CLS]/[SEP]
+            chunk_overlap=32                        # Each chunk shares 32 tokens with the previous one
+        )
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=512,     # Each chunk will contain up to 512 characters
+        chunk_overlap=64,   # Each chunk shares 64 characters with the previous one
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""]   # Prefer paragraph, line, then sentence breaks
+    )
 
 
 # Helper function: Load and split PDF into chunks
 # This is where the document is converted into smaller sections that can be embedded.
-# LangChain’s 'UnstructuredPDFLoader' extracts the text, and
+# pypdf extracts the text of each page (in parallel for larger PDFs), and
 # 'RecursiveCharacterTextSplitter' breaks it into overlapping text chunks.
 
-def load_and_split_data(file_path):
+def load_and_split_data(pdf_bytes, source):
     # Load the raw PDF text into LangChain document objects
-    loader = UnstructuredPDFLoader(file_path=file_path)
-    data = loader.load()
+    data = parallel_load(pdf_bytes, source)
 
     # Split text into overlapping chunks.
     # Overlaps help preserve context across chunk boundaries.
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=7500,    # Each chunk will contain up to 7500 characters
-        chunk_overlap=100   # Each chunk shares 100 characters with the previous one
-    )
+    text_splitter = get_text_splitter()
 
     # Split and return as a list of LangChain Document objects
     chunks = text_splitter.split_documents(data)
     return chunks
 
 
+# Helper function: Embed and store one batch of chunks
+# Instead of letting the vector store embed documents internally, the batch's texts are
+# encoded with a single embed_documents() call (one batched pass for the local model)
+# and the finished vectors are written straight to the store.
+# Only the write itself holds DB_WRITE_LOCK, so other batches can embed meanwhile.
+#
+# With FAISS nothing is written here: the batch's (text, vector) pairs are returned
+# instead, and add_chunks() merges the whole document once every batch has succeeded.
+
+def add_batch(db, chunks, ids):
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+
+    # One batched call for every chunk in the batch
+    embeddings = get_embedding().embed_documents(texts)
+
+    if VECTOR_BACKEND == 'faiss':
+        return list(zip(texts, embeddings)), metadatas, ids
+
+    with DB_WRITE_LOCK:
+        # Write directly to the underlying Chroma collection with precomputed vectors
+        db._collection.add(
+            ids=ids,
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas
+        )
+
+
+# Helper function: Remove partially stored chunks
+# Deletes the given chunk IDs from Chroma (IDs that were never written are ignored).
+# Only needed for Chroma: FAISS batches are staged and never partially written.
+
+def delete_chunks(db, ids):
+    with DB_WRITE_LOCK:
+        db._collection.delete(ids=ids)
+
+
+# Helper function: Merge staged FAISS batches
+# Adds every staged batch to the FAISS index in one go, under DB_WRITE_LOCK.
+# The HNSW index can't remove vectors, so the document is only added once all of
+# its batches were embedded successfully.
+
+def merge_faiss_batches(db, staged):
+    text_embeddings, metadatas, ids = [], [], []
+    for batch_pairs, batch_metadatas, batch_ids in staged:
+        text_embeddings.extend(batch_pairs)
+        metadatas.extend(batch_metadatas)
+        ids.extend(batch_ids)
+
+    with DB_WRITE_LOCK:
+        db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+
+# Helper function: Embed and store all chunks
+# Chunks are processed in WRITE_BATCH_SIZE batches on a small thread pool.
+# Memory stays flat for very large PDFs, and at most WRITE_WORKERS batches are in flight.
+#
+# All-or-nothing: if any batch fails, batches not yet started are cancelled and the
+# document is left out of the store. Otherwise a half-stored document would carry
+# its doc_hash, and every re-upload would be skipped as a duplicate.
+#   - Chroma: chunks already written are deleted again.
+#   - FAISS: batches are only staged in memory (HNSW indexes can't delete), and are
+#     merged into the index after the last one succeeds.
+
+def add_chunks(db, chunks):
+    ids = [uuid4().hex for _ in chunks]
+    batches = [
+        (chunks[i:i + WRITE_BATCH_SIZE], ids[i:i + WRITE_BATCH_SIZE])
+        for i in range(0, len(chunks), WRITE_BATCH_SIZE)
+    ]
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        futures = [executor.submit(add_batch, db, batch, batch_ids) for batch, batch_ids in batches]
+
+        # Stop at the first failure and cancel whatever hasn't started
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+
+    # The executor has finished every batch that was running; check for errors
+    errors = [future.exception() for future in futures if not future.cancelled() and future.exception()]
+    if errors:
+        if VECTOR_BACKEND != 'faiss':
+            delete_chunks(db, ids)
+        raise errors[0]
+
+    if VECTOR_BACKEND == 'faiss':
+        merge_faiss_batches(db, [future.result() for future in futures])
+
+
 # Main function: Embed the document
 # This is the core function that gets called from app.py.
 # It performs the following steps:
 #   1. Validate the uploaded file.
-#   2. Save it temporarily to disk.
-#   3. Load and split its contents.
-#   4. Add embeddings to the vector database.
-#   5. Persist the database and remove the temporary file.
+#   2. Read it into memory.
+#   3. Skip it if an identical file was embedded before (or wait if one is being embedded now).
+#   4. Load and split its contents.
+#   5. Add embeddings to the vector database.
+#   6. Persist the database.
 
 def embed(file):
     # Proceed only if the file exists, has a name, and is a PDF.
     if file.filename != '' and file and allowed_file(file.filename):
-        # Save file locally for temporary processing
-        file_path = save_file(file)
+        # Read the file into memory (it is never written to disk)
+        pdf_bytes, doc_hash = read_upload(file)
 
-        # Load PDF text and split into smaller pieces
-        chunks = load_and_split_data(file_path)
-
-        # Connect to or create the Chroma vector database
+        # Connect to or create the vector database
         db = get_vector_db()
 
-        # Add the new document chunks to the vector store
-        db.add_documents(chunks)
+        # Skip parsing and embedding entirely if this exact file is already stored.
+        # The check also claims the file, so two concurrent uploads of it can't both embed it.
+        if not claim_upload(db, doc_hash):
+            return True
+
+        try:
+            # Load PDF text and split into smaller pieces
+            chunks = load_and_split_data(pdf_bytes, file.filename)
+
+            # Tag every chunk with the file's hash so future uploads can be matched against it
+            for chunk in chunks:
+                chunk.metadata['doc_hash'] = doc_hash
+
+            # Embed the chunks in batches and add them to the vector store
+            add_chunks(db, chunks)
+
+            # Save (persist) the updated database to disk, once for the whole document.
+            # The lock keeps concurrent uploads from writing to the store at the same time.
+            with DB_WRITE_LOCK:
+                persist_vector_db(db)
 
-        # Save (persist) the updated embeddings database to disk
-        db.persist()
+            # Record the new document so FAISS duplicate checks stay a set lookup
+            if VECTOR_BACKEND == 'faiss':
+                faiss_hashes(db).add(doc_hash)
+        finally:
+            # Stored or failed, let waiting uploads of the same file re-check
+            release_upload(doc_hash)
 
-        # Remove the temporary file now that it has been processed
-        os.remove(file_path)
+        # The keyword index and cached answers were built without this document.
+        # Rebuild the index first, so answers cached after the clear already see it.
+        rebuild_bm25_retriever()
+        QUERY_CACHE.clear()
 
         # Return True to indicate success
         return True
@@ -109,15 +419,33 @@ Chunking:
 
   - Splitting into chunks allows semantic search to work on smaller, context-rich sections.
 
+  - Chunks are sized to the embedding model's input window (256 tokens for the default model).
+
 Vector storage:
 
   - Each chunk is turned into a vector (numerical representation).
 
+  - Chunks are embedded and stored in batches of 256, several batches at a time.
+
   - These vectors are stored in ChromaDB, allowing the model to quickly retrieve relevant passages.
 
-Temporary files:
+Parsing:
+
+  - Text is extracted page by page with pypdf, straight from the uploaded bytes.
+
+  - Large PDFs are split into small page batches that are parsed in separate processes.
+
+  - Scanned pages (no text layer) are OCR'd with Unstructured, page by page, inside the same worker processes.
+
+Duplicate uploads:
+
+  - Each file is hashed before parsing. If its hash is already in the database, the upload is skipped.
+
+  - Concurrent uploads of the same file are serialized: the second waits for the first and is then skipped.
+
+No temporary files:
 
-  - PDFs are saved only long enough to process them, then deleted for security and cleanliness.
+  - Uploads are processed entirely in memory and never written to disk.
 
 Separation of concerns:
 
@@ -1,43 +1,222 @@
 # Imports
 
 import os
+import atexit                                                       # Runs cleanup code when the process exits
+import shutil                                                       # Copies the Chroma directory to and from the RAM disk
+import threading                                                    # Guards one-time initialization across request threads
 from langchain_community.embeddings import OllamaEmbeddings       # Interface to generate text embeddings using Ollama
+from local_embeddings import LocalSTEmbeddings                      # In-process, batched SentenceTransformer embeddings
 from langchain_community.vectorstores.chroma import Chroma          # LangChain wrapper for ChromaDB
+from langchain_community.retrievers import BM25Retriever            # Keyword (lexical) search over stored chunks
+from langchain_core.documents import Document                       # LangChain's text + metadata container
 
 # Environment Configuration
 # These environment variables are defined in the .env file and can be overridden per environment.
 
+# Which vector store to use:
+#   - 'chroma' (default): ChromaDB, persisted as sqlite + HNSW files
+#   - 'faiss': a FAISS HNSW index held in memory and saved to FAISS_PATH
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+
 # Directory where Chroma will persist its database files.
 CHROMA_PATH = os.getenv('CHROMA_PATH', 'chroma')
 
+# Set CHROMA_RAMDISK=1 to run Chroma from a RAM-backed directory (tmpfs) for speed.
+# CHROMA_PATH is copied there on startup and copied back on a clean shutdown.
+# Anything embedded since startup is lost if the process crashes, so use this for
+# corpora that can be re-embedded.
+CHROMA_RAMDISK = os.getenv('CHROMA_RAMDISK', '0') == '1' and os.path.isdir('/dev/shm')
+CHROMA_RAMDISK_PATH = os.getenv('CHROMA_RAMDISK_PATH', '/dev/shm/chroma')
+
+# Directory where the FAISS index and its document store are saved.
+FAISS_PATH = os.getenv('FAISS_PATH', 'faiss')
+
+# Number of chunks returned per similarity search.
+# FAISS searches are cheap, so it defaults to a wider net than Chroma.
+SEARCH_K = int(os.getenv('SEARCH_K', '10' if VECTOR_BACKEND == 'faiss' else '4'))
+
+# Process-wide cache of vector store clients (one per backend) and the embedding engine.
+# Building these is expensive (model load, index deserialization), so it happens once.
+_DB_SINGLETONS = {}
+_EMBEDDING_SINGLETON = None
+_DB_LOCK = threading.Lock()
+
+# Separate lock for the embedding engine: building a vector store (under _DB_LOCK)
+# calls get_embedding(), and a plain Lock can't be acquired twice by one thread.
+_EMBEDDING_LOCK = threading.Lock()
+
+# ChromaDB does not support concurrent writers, so every write to the store holds this lock.
+DB_WRITE_LOCK = threading.Lock()
+
+# Backends this process has written to. Only these are saved again at exit, so a process
+# that merely read the store can't overwrite newer data on disk with its stale snapshot.
+_WRITTEN_BACKENDS = set()
+
+# Keyword (BM25) index over every stored chunk, rebuilt at the end of each upload.
+_BM25_SINGLETON = None
+_BM25_LOCK = threading.Lock()
+
+# Set once a query asks for the BM25 index (hybrid mode); uploads skip the rebuild otherwise.
+_BM25_IN_USE = False
+
+# Build ordering: every build takes a ticket before reading the store, and a finished build
+# only replaces the index if no build with a later ticket (newer data) got there first.
+_BM25_TICKETS = 0
+_BM25_INSTALLED = 0
+
 # Name of the Chroma collection (similar to a table or index).
 COLLECTION_NAME = os.getenv('COLLECTION_NAME', 'local-rag')
 
-# Embedding model to use when generating text embeddings.
+# Which embedding engine to use:
+#   - 'sentence-transformers' (default): local, batched encoding inside this process
+#   - 'ollama': one HTTP call per chunk to the local Ollama server
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'sentence-transformers')
+
+# Embedding model to use when EMBEDDING_BACKEND is 'ollama'.
 # This should match an Ollama model capable of generating embeddings.
 TEXT_EMBEDDING_MODEL = os.getenv('TEXT_EMBEDDING_MODEL', 'nomic-embed-text')
 
 
-# Function: get_vector_db
+# Helper function: _build_embedding()
+# Creates the embedding engine selected by EMBEDDING_BACKEND.
+# Note: switching backends changes the vector size, so use a fresh CHROMA_PATH/COLLECTION_NAME.
+
+def _build_embedding():
+    if EMBEDDING_BACKEND == 'ollama':
+        return OllamaEmbeddings(model=TEXT_EMBEDDING_MODEL, show_progress=False)
+
+    return LocalSTEmbeddings(show_progress=False)
+
+
+# Helper function: get_embedding()
+# Returns the shared embedding engine, creating it on first use.
+# Double-checked locking: the fast path skips the lock once the engine exists.
+
+def get_embedding():
+    global _EMBEDDING_SINGLETON
+
+    if _EMBEDDING_SINGLETON is None:
+        with _EMBEDDING_LOCK:
+            if _EMBEDDING_SINGLETON is None:
+                _EMBEDDING_SINGLETON = _build_embedding()
+
+    return _EMBEDDING_SINGLETON
+
+
+# Helper function: get_faiss_db()
+# Loads the saved FAISS index if one exists, otherwise builds an empty HNSW index.
+#
+# HNSW settings:
+#   - M=32: neighbors per graph node (higher = better recall, more memory)
+#   - efConstruction=200: search width while building the graph
+#   - efSearch=64: search width while querying
+
+def get_faiss_db(embedding):
+    # Imported here so FAISS is only required when VECTOR_BACKEND=faiss
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    # FAISS with searches guarded by DB_WRITE_LOCK.
+    # An upload mutates the index, docstore and id mapping together; a search running in
+    # the middle could see them out of step. The query embedding is computed before this
+    # method is called, so only the (fast) index lookup waits for the lock.
+    class LockedFAISS(FAISS):
+        def similarity_search_with_score_by_vector(self, *args, **kwargs):
+            with DB_WRITE_LOCK:
+                return super().similarity_search_with_score_by_vector(*args, **kwargs)
+
+    # Reuse the index saved by a previous embed() call
+    if os.path.exists(os.path.join(FAISS_PATH, 'index.faiss')):
+        # The docstore is pickled by save_local(); only load files this app wrote itself
+        return LockedFAISS.load_local(FAISS_PATH, embedding, allow_dangerous_deserialization=True)
+
+    # The index needs the vector size up front, so embed a probe string once
+    dim = len(embedding.embed_query('dimension probe'))
+
+    index = faiss.IndexHNSWFlat(dim, 32)
+    index.hnsw.efConstruction = 200
+    index.hnsw.efSearch = 64
+
+    return LockedFAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+
+
+# Helper function: persist_vector_db()
+# Saves the vector store to disk in whatever way the active backend needs.
+# Called after every write, so it also records that this process owns changes to save.
+
+def persist_vector_db(db, backend=VECTOR_BACKEND):
+    _WRITTEN_BACKENDS.add(backend)
+
+    if backend == 'faiss':
+        db.save_local(FAISS_PATH)
+    else:
+        db.persist()
+
+
+# Helper function: _copy_chroma_to_ramdisk()
+# Replaces the RAM-disk copy with a fresh copy of CHROMA_PATH.
+# A leftover copy from a crashed run is removed first: merging into it would mix its newer
+# HNSW segment files with the older sqlite file from disk.
+
+def _copy_chroma_to_ramdisk():
+    shutil.rmtree(CHROMA_RAMDISK_PATH, ignore_errors=True)
+    if os.path.isdir(CHROMA_PATH):
+        shutil.copytree(CHROMA_PATH, CHROMA_RAMDISK_PATH)
+
+
+# Helper function: _copy_chroma_from_ramdisk()
+# Replaces CHROMA_PATH with the RAM-disk copy.
+# The copy is written to a temporary directory next to CHROMA_PATH and then swapped in,
+# so files Chroma deleted in RAM don't survive on disk, and a failed copy leaves the
+# old database untouched.
+
+def _copy_chroma_from_ramdisk():
+    target = os.path.normpath(CHROMA_PATH)
+    staging = target + '.tmp'
+    backup = target + '.old'
+
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.copytree(CHROMA_RAMDISK_PATH, staging)
+
+    shutil.rmtree(backup, ignore_errors=True)
+    if os.path.isdir(target):
+        os.replace(target, backup)
+    os.replace(staging, target)
+    shutil.rmtree(backup, ignore_errors=True)
+
+
+# Helper function: _build_vector_db()
 # Purpose:
-#   Initializes and returns a Chroma vector database client.
+#   Initializes a vector database client (Chroma by default, FAISS if configured).
 #   This function ensures that the same configuration is used
 #   everywhere the vector DB is accessed (embedding and querying).
 #
 # Workflow:
-#   1. Create an embedding function using Ollama (running locally).
-#   2. Initialize a ChromaDB collection with that embedding function.
-#   3. Return a Chroma object that can be used to store or query embeddings.
-#
-# This function is used both in:
-#   - embed.py (to add new document embeddings)
-#   - query.py (to search for relevant chunks during queries)
+#   1. Create an embedding function (local SentenceTransformer or Ollama).
+#   2. Initialize a ChromaDB collection (or FAISS index) with that embedding function.
+#   3. Return a vector store object that can be used to store or query embeddings.
 
-def get_vector_db():
-    # Step 1: Create an embedding generator using Ollama
+def _build_vector_db(backend):
+    # Step 1: Create an embedding generator
     # The embedding model is responsible for converting text into high-dimensional numeric vectors.
-    # Setting 'show_progress=True' provides feedback during large embedding operations.
-    embedding = OllamaEmbeddings(model=TEXT_EMBEDDING_MODEL, show_progress=True)
+    # The default local model encodes all chunks in a few batched passes instead of one HTTP call each.
+    embedding = get_embedding()
+
+    # FAISS keeps everything in a single in-process index (no sqlite layer)
+    if backend == 'faiss':
+        return get_faiss_db(embedding)
+
+    # With a RAM disk, start from a copy of the on-disk database and work from memory
+    persist_directory = CHROMA_PATH
+    if CHROMA_RAMDISK:
+        _copy_chroma_to_ramdisk()
+        persist_directory = CHROMA_RAMDISK_PATH
 
     # Step 2: Initialize a Chroma database (local vector store)
     # - 'collection_name': logical grouping of vectors (like a table name)
@@ -45,7 +224,7 @@ def get_vector_db():
     # - 'embedding_function': the embedding engine used for encoding and search
     db = Chroma(
         collection_name=COLLECTION_NAME,
-        persist_directory=CHROMA_PATH,
+        persist_directory=persist_directory,
         embedding_function=embedding
     )
 
@@ -55,6 +234,103 @@ def get_vector_db():
     #   - similarity_search(query) → retrieve context for a given question
     #   - persist()         → save updates to disk
     return db
+
+
+# Function: get_vector_db
+# Purpose:
+#   Returns the shared vector database client, building it on the first call only.
+#   Later calls (every /embed and /query request) reuse the open client instead of
+#   reloading the embedding model and reopening the index from disk.
+#
+# This function is used both in:
+#   - embed.py (to add new document embeddings)
+#   - query.py (to search for relevant chunks during queries)
+
+def get_vector_db(backend=VECTOR_BACKEND):
+    db = _DB_SINGLETONS.get(backend)
+
+    if db is None:
+        with _DB_LOCK:
+            db = _DB_SINGLETONS.get(backend)
+            if db is None:
+                db = _DB_SINGLETONS[backend] = _build_vector_db(backend)
+
+    return db
+
+
+# Helper function: _stored_documents()
+# Returns every chunk currently in the vector store as LangChain Documents.
+
+def _stored_documents(db, backend):
+    if backend == 'faiss':
+        # Copy under the write lock so a concurrent upload can't resize the dict mid-iteration
+        with DB_WRITE_LOCK:
+            return list(db.docstore._dict.values())
+
+    stored = db.get(include=['documents', 'metadatas'])
+    return [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(stored['documents'], stored['metadatas'])
+    ]
+
+
+# Function: get_bm25_retriever
+# Purpose:
+#   Returns a BM25 keyword retriever over all stored chunks, or None if the store is empty.
+#   The index is built from the vector store itself (so there is no second copy of the
+#   data to keep in sync). It is built here on first use (normally by warm_up()), and
+#   after that kept current by rebuild_bm25_retriever() at the end of every upload.
+
+def get_bm25_retriever(backend=VECTOR_BACKEND):
+    global _BM25_SINGLETON, _BM25_IN_USE, _BM25_TICKETS, _BM25_INSTALLED
+
+    if _BM25_SINGLETON is None:
+        db = get_vector_db(backend)
+        with _BM25_LOCK:
+            _BM25_IN_USE = True
+            if _BM25_SINGLETON is None:
+                _BM25_TICKETS += 1
+                _BM25_INSTALLED = _BM25_TICKETS
+                documents = _stored_documents(db, backend)
+                if not documents:
+                    return None
+                _BM25_SINGLETON = BM25Retriever.from_documents(documents, k=SEARCH_K)
+
+    return _BM25_SINGLETON
+
+
+# Helper function: rebuild_bm25_retriever()
+# Builds a fresh BM25 index over the stored chunks and swaps it in (called by embed()
+# after new chunks are stored). The rebuild runs in the uploading thread without holding
+# _BM25_LOCK, so queries keep using the previous index until the new one is ready.
+
+def rebuild_bm25_retriever(backend=VECTOR_BACKEND):
+    global _BM25_SINGLETON, _BM25_TICKETS, _BM25_INSTALLED
+
+    with _BM25_LOCK:
+        if not _BM25_IN_USE:
+            return
+        _BM25_TICKETS += 1
+        ticket = _BM25_TICKETS
+
+    documents = _stored_documents(get_vector_db(backend), backend)
+    retriever = BM25Retriever.from_documents(documents, k=SEARCH_K) if documents else None
+
+    with _BM25_LOCK:
+        if ticket > _BM25_INSTALLED:
+            _BM25_SINGLETON = retriever
+            _BM25_INSTALLED = ticket
+
+
+# Save the vector stores this process wrote to when it exits,
+# then copy the RAM-disk Chroma database back to permanent storage
+@atexit.register
+def _persist_on_exit():
+    for backend in list(_WRITTEN_BACKENDS):
+        persist_vector_db(_DB_SINGLETONS[backend], backend)
+
+    if CHROMA_RAMDISK and 'chroma' in _WRITTEN_BACKENDS:
+        _copy_chroma_from_ramdisk()
     
 '''
 Notes:
@@ -64,6 +340,8 @@ Separation of Concerns
 
   - Any script that calls it will use the same model, directory, and collection name.
 
+  - It also returns the same client object every time, so the model and index are only loaded once per process.
+
 ChromaDB as a Vector Store
 
   - Think of ChromaDB like a “searchable memory.”
@@ -72,11 +350,31 @@ ChromaDB as a Vector Store
 
   - During a query, Chroma finds the closest vectors (most similar meanings).
 
-Embeddings via Ollama
+RAM disk (optional)
+
+  - With CHROMA_RAMDISK=1, Chroma reads and writes a copy of its files in /dev/shm, avoiding disk syncs.
+
+  - The copy is written back to CHROMA_PATH when the app shuts down cleanly.
+
+FAISS as an Alternative
+
+  - Set VECTOR_BACKEND=faiss to skip Chroma's sqlite layer and search a FAISS HNSW index directly.
+
+  - The index lives in memory and is written to FAISS_PATH after each upload.
+
+BM25 keyword index
+
+  - get_bm25_retriever() builds a keyword index over the same stored chunks for hybrid search.
+
+  - Uploads rebuild it before returning, so queries never pay for the rebuild.
+
+Embeddings
 
   - The embedding model translates text → numbers.
 
-  - Ollama runs this model locally, so nothing is sent to the cloud.
+  - By default a SentenceTransformer runs inside this process and encodes chunks in batches.
+
+  - Set EMBEDDING_BACKEND=ollama to use Ollama's embedding models instead. Either way, nothing is sent to the cloud.
 
 Persistence
 
@@ -0,0 +1,31 @@
+# Gunicorn configuration
+# Usage: gunicorn app:app   (this file is picked up automatically from the working directory)
+
+import os
+
+# Listen on every interface, same port as the Flask dev server and the curl examples.
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8080')
+
+# A single gthread worker: one process serves several requests at once on a thread pool,
+# so a slow /embed no longer blocks /query.
+# Exactly one process, on purpose: the vector store client, its write lock, the BM25 index
+# and the answer cache all live in process memory. With several workers, each would hold
+# its own copy. Uploads would then leave the other workers stale, and FAISS saves from
+# different workers would overwrite each other.
+worker_class = 'gthread'
+workers = 1
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Load the app inside the worker, not in the master before forking, so the models, the
+# database client and the SQLite cache are never copied across a fork (which is unsafe
+# for open connections and for CUDA).
+preload_app = False
+
+# Embedding a large PDF can take minutes; don't kill the worker mid-request.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '600'))
+
+
+# Warm up models and indexes once the worker has loaded the app, before it takes requests.
+def post_worker_init(worker):
+    from app import startup_warm_up
+    startup_warm_up()
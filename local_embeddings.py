@@ -0,0 +1,86 @@
+# Imports
+
+import os
+import torch                                                       # Used for dynamic int8 quantization of the encoder
+from langchain_core.embeddings import Embeddings                   # Base interface every LangChain embedding class implements
+from sentence_transformers import SentenceTransformer              # Runs transformer encoders locally, in-process
+
+# Configuration
+
+# Sentence-Transformers model used to encode text.
+# 'all-MiniLM-L6-v2' produces 384-dimensional vectors and is fast even on CPU.
+ST_MODEL = os.getenv('ST_MODEL', 'all-MiniLM-L6-v2')
+
+# Inference backend: 'torch' (default) or 'onnx' (ONNX Runtime, faster on CPU-only machines).
+# The ONNX backend loads the model through Hugging Face Optimum (pinned in requirements.txt).
+ST_BACKEND = os.getenv('ST_BACKEND', 'torch')
+
+# Number of texts encoded per forward pass.
+ST_BATCH_SIZE = int(os.getenv('ST_BATCH_SIZE', '64'))
+
+# Set ST_QUANTIZE=1 to run the encoder's linear layers in int8 (torch backend, CPU inference).
+ST_QUANTIZE = os.getenv('ST_QUANTIZE', '0') == '1'
+
+
+# Class: LocalSTEmbeddings
+# Purpose:
+#   A LangChain-compatible embedding class backed by a local SentenceTransformer.
+#
+# Why this matters:
+#   OllamaEmbeddings sends one HTTP request per chunk. For a PDF with hundreds of chunks
+#   that means hundreds of round trips over localhost. Encoding in-process lets the model
+#   handle a whole list of chunks in a few batched forward passes instead.
+
+class LocalSTEmbeddings(Embeddings):
+    def __init__(self, model_name=ST_MODEL, backend=ST_BACKEND, batch_size=ST_BATCH_SIZE,
+                 quantize=ST_QUANTIZE, show_progress=False):
+        # ONNX Runtime is pinned to the CPU provider; the torch backend picks CPU/GPU on its own
+        model_kwargs = {"provider": "CPUExecutionProvider"} if backend == 'onnx' else None
+
+        self.model = SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs)
+
+        # Dynamic quantization stores Linear weights as int8 and quantizes activations on the fly.
+        # Only supported on CPU, so the model is moved there first.
+        if quantize and backend == 'torch':
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model.to('cpu'), {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        self.batch_size = batch_size
+        self.show_progress = show_progress
+
+    # Encode many texts at once (used when adding documents to the vector store)
+    def embed_documents(self, texts):
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,       # Unit-length vectors: cosine similarity == dot product
+            show_progress_bar=self.show_progress
+        )
+        return embeddings.tolist()
+
+    # Encode a single search query
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+'''
+Notes:
+Batching
+
+  - encode() tokenizes and runs the model over up to ST_BATCH_SIZE texts per step.
+
+  - One batched matrix multiply is far cheaper than many single-text calls.
+
+Normalization
+
+  - Vectors are normalized to unit length, so similarity search compares direction (meaning) only.
+
+CPU-only machines
+
+  - Set ST_BACKEND=onnx to run the encoder through ONNX Runtime instead of PyTorch.
+
+  - Set ST_QUANTIZE=1 to run the PyTorch encoder with int8 weights (roughly 4× less weight memory traffic).
+
+  - The output vectors stay float32, because Chroma's HNSW index only stores floats.
+'''
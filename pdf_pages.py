@@ -0,0 +1,48 @@
+# Imports
+# This module runs inside the PDF worker processes, so it deliberately imports nothing
+# heavy (no torch, LangChain or vector store). Workers start fast and stay small.
+
+import io                                 # Wraps PDF bytes as an in-memory file
+from pypdf import PdfReader, PdfWriter    # Lightweight PDF reader/writer for page-level work
+
+
+# Helper function: ocr_page()
+# Purpose:
+#   Reads a scanned page (an image with no text layer) with Unstructured's OCR.
+#   The page is copied into its own one-page PDF in memory, so only that page is OCR'd.
+
+def ocr_page(page):
+    # Heavy import, only loaded by workers that actually meet a scanned page
+    from unstructured.partition.pdf import partition_pdf
+
+    writer = PdfWriter()
+    writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+
+    elements = partition_pdf(file=buffer, strategy='ocr_only')
+    return "\n\n".join(str(element) for element in elements)
+
+
+# Function: extract_pages()
+# Purpose:
+#   Extracts the text of every page in a PDF (or PDF page batch).
+#   Pages without a text layer (scanned pages) fall back to OCR, one page at a time,
+#   so a mixed PDF keeps both its text pages and its scanned pages.
+#   Returns (page_number, text) pairs, numbering pages from 'first_page'.
+#
+# Called by:
+#   embed.py → parallel_load(), through the shared process pool
+
+def extract_pages(pdf_bytes, first_page=0):
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+
+    pages = []
+    for i, page in enumerate(reader.pages):
+        text = page.extract_text() or ''
+        if not text.strip():
+            text = ocr_page(page)
+        pages.append((first_page + i, text))
+
+    return pages
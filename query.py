@@ -1,12 +1,18 @@
 # Imports
 
 import os
+import threading                                                        # Guards one-time creation of the shared LLM client
+import numpy as np                                                      # Dummy arrays for compiling the cache kernel at warm-up
+from langchain_community.cache import SQLiteCache                      # On-disk cache of LLM responses
 from langchain_community.chat_models import ChatOllama                 # Wrapper to use Ollama for local LLM chat
+from langchain_core.globals import set_llm_cache                        # Installs a cache for every LLM call
 from langchain_core.output_parsers import StrOutputParser               # Converts model responses into plain strings
 from langchain_core.runnables import RunnablePassthrough                # Used to pass variables directly into chains
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate   # Tools for creating structured prompts
 from langchain_classic.retrievers import MultiQueryRetriever            # Expands a single query into multiple related ones
-from get_vector_db import get_vector_db                                 # Connects to ChromaDB for vector retrieval
+from langchain_classic.retrievers import EnsembleRetriever              # Fuses several retrievers' rankings into one
+from get_vector_db import get_vector_db, get_embedding, get_bm25_retriever, SEARCH_K   # Vector DB + keyword retrieval
+from query_cache import QUERY_CACHE, cosine_scores                      # Reuses answers to semantically similar questions
 
 # Configuration
 
@@ -14,8 +20,60 @@ from get_vector_db import get_vector_db                                 # Connec
 # Example: 'mistral', 'llama2', or any other model available in Ollama.
 LLM_MODEL = os.getenv('LLM_MODEL', 'mistral')
 
+# How relevant chunks are retrieved:
+#   - 'hybrid' (default): BM25 keyword search + vector search, fused by reciprocal rank
+#   - 'multiquery': the LLM rewrites the question five ways and each version is searched
+RETRIEVER_MODE = os.getenv('RETRIEVER_MODE', 'hybrid')
 
-# Helper function: get_prompt()
+# How long Ollama keeps the model loaded in memory after a request (e.g., '24h', '-1' for forever).
+# Keeping it resident avoids reloading the model from disk on the next query.
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '24h')
+
+# SQLite file where LLM responses are cached (set to an empty value to disable).
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.llm_cache.db')
+
+# Shared LLM client, created on first use and reused by every request
+_LLM_SINGLETON = None
+_LLM_LOCK = threading.Lock()
+
+
+# LLM response cache
+# Every LLM call is looked up by (model settings, exact prompt) before reaching Ollama.
+# The biggest win is the paraphrasing step: the same question always produces the same
+# rephrasing prompt, so repeat questions skip that LLM call entirely.
+# The cache lives in SQLite, so it survives restarts.
+if LLM_CACHE_PATH:
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+
+
+# Class: ParallelMultiQueryRetriever
+# Purpose:
+#   Same behavior as MultiQueryRetriever, but the similarity searches for the
+#   rephrased questions run concurrently instead of one after another.
+#
+# How it works:
+#   - retrieve_documents(): Runnable.batch() runs each search on its own worker thread,
+#     so the embedding calls and index lookups for all five variants overlap.
+#   - unique_union(): removes duplicates with a dictionary keyed by (source, content),
+#     instead of comparing every document against every earlier one.
+
+class ParallelMultiQueryRetriever(MultiQueryRetriever):
+    def retrieve_documents(self, queries, run_manager):
+        results = self.retriever.batch(
+            queries,
+            config={"callbacks": run_manager.get_child(), "max_concurrency": len(queries) or None}
+        )
+        return [doc for docs in results for doc in docs]
+
+    def unique_union(self, documents):
+        unique = {}
+        for doc in documents:
+            key = (doc.metadata.get('source'), hash(doc.page_content))
+            unique.setdefault(key, doc)
+        return list(unique.values())
+
+
+# Helper function: _build_prompts()
 # Purpose:
 #   Defines two prompt templates:
 #     1. QUERY_PROMPT — used to generate multiple alternative versions of the question
@@ -29,7 +87,7 @@ LLM_MODEL = os.getenv('LLM_MODEL', 'mistral')
 #   The second prompt then forms the “answering” phase — telling the LLM to use only
 #   the retrieved documents to answer the question.
 
-def get_prompt():
+def _build_prompts():
     # Prompt for generating alternative search questions
     QUERY_PROMPT = PromptTemplate(
         input_variables=["question"],
@@ -54,57 +112,156 @@ def get_prompt():
     return QUERY_PROMPT, prompt
 
 
-# Main function: query()
-# Purpose:
-#   Handles the full retrieval and response generation process:
-#     1. Initialize the model (ChatOllama).
-#     2. Retrieve relevant chunks from ChromaDB using a multi-query approach.
-#     3. Pass the retrieved context and question into a prompt chain.
-#     4. Generate and return a final answer.
-#
-# Called by:
-#   app.py → route_query()
+# The templates never change, so they are built once at import time
+_PROMPTS = _build_prompts()
 
-def query(input):
-    # Proceed only if the user provided a valid query string
-    if input:
-        # Step 1: Initialize the local language model
-        # ChatOllama provides a conversational interface to models hosted by Ollama.
-        # This allows full offline inference through a locally running model like Mistral.
-        llm = ChatOllama(model=LLM_MODEL)
 
-        # Step 2: Connect to the Chroma vector database
-        # This gives us access to stored embeddings and similarity search functionality.
-        db = get_vector_db()
+# Helper function: get_prompt()
+# Returns the (QUERY_PROMPT, prompt) pair built at import time.
+
+def get_prompt():
+    return _PROMPTS
+
 
-        # Step 3: Load both the query-generation and answer-generation prompts
-        QUERY_PROMPT, prompt = get_prompt()
+# Helper function: get_llm()
+# Returns the shared ChatOllama client, creating it on the first call only.
 
-        # Step 4: Create a retriever that generates multiple query variants
+def get_llm():
+    global _LLM_SINGLETON
+
+    if _LLM_SINGLETON is None:
+        with _LLM_LOCK:
+            if _LLM_SINGLETON is None:
+                _LLM_SINGLETON = ChatOllama(model=LLM_MODEL, keep_alive=OLLAMA_KEEP_ALIVE)
+
+    return _LLM_SINGLETON
+
+
+# Helper function: get_retriever()
+# Purpose:
+#   Builds the retriever selected by RETRIEVER_MODE.
+#
+# Hybrid search:
+#   BM25 catches exact keyword matches (names, codes, rare terms) that embeddings can miss,
+#   while vector search catches paraphrases. EnsembleRetriever merges both result lists with
+#   reciprocal rank fusion (weights 0.4 BM25 / 0.6 dense). This addresses the same wording
+#   mismatch as multi-query expansion, without the extra LLM call and five searches.
+
+def get_retriever(db, llm, QUERY_PROMPT):
+    dense = db.as_retriever(search_kwargs={'k': SEARCH_K})  # Base retriever (vector similarity search)
+
+    if RETRIEVER_MODE == 'multiquery':
         # MultiQueryRetriever uses the language model to rewrite the input query in
         # several ways before running similarity search. This helps capture semantically
         # related chunks that might otherwise be missed.
-        retriever = MultiQueryRetriever.from_llm(
-            db.as_retriever(),  # Base retriever (Chroma similarity search)
+        # The parallel subclass runs those searches at the same time.
+        return ParallelMultiQueryRetriever.from_llm(
+            dense,
             llm,                # The LLM used to generate reworded queries
             prompt=QUERY_PROMPT  # The prompt guiding rephrasing
         )
 
-        # Step 5: Build the LangChain "Runnable" pipeline (also called a chain)
-        # This defines how data flows through the retrieval and generation process:
-        #
-        #   User question --> retriever --> context --> prompt --> LLM --> text output
-        #
-        # The pipe operator (|) is used to connect components together.
-        chain = (
-            {"context": retriever, "question": RunnablePassthrough()}  # Feed both context and question
-            | prompt                                                   # Format input into a final structured prompt
-            | llm                                                      # Generate the model’s response
-            | StrOutputParser()                                        # Convert the result into a plain text string
-        )
+    # No stored chunks yet means no keyword index; fall back to vector search alone
+    bm25 = get_bm25_retriever()
+    if bm25 is None:
+        return dense
+
+    return EnsembleRetriever(retrievers=[bm25, dense], weights=[0.4, 0.6])
+
+
+# Helper function: warm_up()
+# Purpose:
+#   Loads everything a query needs before the first real request arrives:
+#     - the LLM (Ollama loads it into memory and keeps it there for OLLAMA_KEEP_ALIVE)
+#     - the embedding model and the vector index
+#     - the BM25 keyword index (hybrid mode)
+#     - the semantic cache's Numba kernel (compiled on its first call)
+#   Without this, the first user query pays several seconds of model loading.
+#   The LLM call uses its own uncached client: a cached 'warmup' answer would be served
+#   from the SQLite LLM cache and never make Ollama load the model.
+
+def warm_up():
+    # Compile first: it needs neither Ollama nor the vector store, so it still happens if they're down
+    cosine_scores(np.zeros((1, 1), dtype=np.float32), np.zeros(1, dtype=np.float32))
+
+    ChatOllama(model=LLM_MODEL, keep_alive=OLLAMA_KEEP_ALIVE, cache=False).invoke('warmup')
+    get_vector_db().similarity_search('warmup', k=1)
 
-        # Step 6: Execute the full chain on the given input
-        response = chain.invoke(input)
+    if RETRIEVER_MODE != 'multiquery':
+        get_bm25_retriever()
+
+
+# Helper function: build_chain()
+# Purpose:
+#   Assembles the retrieval + generation pipeline shared by query() and query_stream().
+#     1. Get the model (ChatOllama).
+#     2. Connect to the vector database.
+#     3. Load the prompts.
+#     4. Build the retriever (hybrid BM25 + vector by default, or multi-query).
+#     5. Chain retriever → prompt → LLM → plain text.
+
+def build_chain():
+    # Step 1: Get the local language model
+    # ChatOllama provides a conversational interface to models hosted by Ollama.
+    # This allows full offline inference through a locally running model like Mistral.
+    # The client is shared across requests rather than rebuilt each time.
+    llm = get_llm()
+
+    # Step 2: Connect to the vector database
+    # This gives us access to stored embeddings and similarity search functionality.
+    # get_vector_db() returns the already-open client after the first call.
+    db = get_vector_db()
+
+    # Step 3: Load both the query-generation and answer-generation prompts
+    QUERY_PROMPT, prompt = get_prompt()
+
+    # Step 4: Create the retriever that finds relevant chunks (see get_retriever())
+    retriever = get_retriever(db, llm, QUERY_PROMPT)
+
+    # Step 5: Build the LangChain "Runnable" pipeline (also called a chain)
+    # This defines how data flows through the retrieval and generation process:
+    #
+    #   User question --> retriever --> context --> prompt --> LLM --> text output
+    #
+    # The pipe operator (|) is used to connect components together.
+    # StrOutputParser passes text through piece by piece, so the chain can also be streamed.
+    chain = (
+        {"context": retriever, "question": RunnablePassthrough()}  # Feed both context and question
+        | prompt                                                   # Format input into a final structured prompt
+        | llm                                                      # Generate the model’s response
+        | StrOutputParser()                                        # Convert the result into a plain text string
+    )
+
+    return chain
+
+
+# Main function: query()
+# Purpose:
+#   Handles the full retrieval and response generation process:
+#     1. Return a cached answer if a near-identical question was already answered.
+#     2. Otherwise build the chain (see build_chain()) and run it.
+#     3. Cache and return the final answer.
+#
+# Called by:
+#   app.py → route_query()
+
+def query(input):
+    # Proceed only if the user provided a valid query string
+    if input:
+        # Step 1: Check the semantic cache
+        # Embedding the question is cheap compared to the LLM calls below, and a close
+        # enough match (cosine similarity >= QUERY_CACHE_THRESHOLD) skips them entirely.
+        query_embedding = get_embedding().embed_query(input)
+        cached, generation = QUERY_CACHE.lookup(query_embedding)
+        if cached is not None:
+            return cached
+
+        # Step 2: Execute the full chain on the given input
+        response = build_chain().invoke(input)
+
+        # Step 3: Remember the answer for similar future questions
+        if response:
+            QUERY_CACHE.add(query_embedding, response, generation)
 
         # Return the final answer text
         return response
@@ -112,6 +269,36 @@ def query(input):
     # Return None if no input was provided
     return None
 
+
+# Streaming variant: query_stream()
+# Purpose:
+#   Same as query(), but yields the answer piece by piece as the LLM generates it,
+#   so the client sees the first words right away instead of waiting for the full answer.
+#
+# Called by:
+#   app.py → route_query_stream()
+
+def query_stream(input):
+    if not input:
+        return
+
+    # A cached answer is sent as a single piece
+    query_embedding = get_embedding().embed_query(input)
+    cached, generation = QUERY_CACHE.lookup(query_embedding)
+    if cached is not None:
+        yield cached
+        return
+
+    # Forward each piece as soon as it arrives, keeping a copy for the cache
+    pieces = []
+    for piece in build_chain().stream(input):
+        pieces.append(piece)
+        yield piece
+
+    response = ''.join(pieces)
+    if response:
+        QUERY_CACHE.add(query_embedding, response, generation)
+
 '''
 Notes:
 Retrieval-Augmented Generation in action
@@ -120,7 +307,13 @@ Retrieval-Augmented Generation in action
 
   - Generation (via ChatOllama) produces a coherent answer grounded in those facts.
 
-MultiQueryRetriever’s role
+Hybrid retrieval (default)
+
+  - BM25 keyword search and vector search each rank the stored chunks.
+
+  - Their rankings are fused, so a chunk that matches either the exact words or the meaning can be found.
+
+MultiQueryRetriever’s role (RETRIEVER_MODE=multiquery)
 
   - Traditional vector search finds embeddings close to one query.
 
@@ -128,6 +321,20 @@ MultiQueryRetriever’s role
 
   - This helps overcome the “semantic gap” between user phrasing and stored text.
 
+  - The paraphrased searches are independent, so they run concurrently on a thread pool.
+
+LLM cache
+
+  - Identical LLM prompts (most notably the paraphrasing prompt) are answered from an on-disk SQLite cache.
+
+Streaming
+
+  - query_stream() yields the answer as it is generated, which cuts the time to the first word.
+
+Semantic cache
+
+  - Repeated or reworded questions are answered from query_cache.py without touching the LLM.
+
 Prompt chaining
 
   - LangChain’s Runnable design makes it easy to define a linear data pipeline.
@@ -0,0 +1,154 @@
+# Imports
+
+import os
+import threading                      # Requests may hit the cache from several threads at once
+import numpy as np                    # Stores cached query embeddings as one matrix for fast comparison
+
+# Numba compiles the similarity loop to native SIMD code; without it, NumPy is used instead.
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Configuration
+
+# Minimum cosine similarity between two questions for the cached answer to be reused.
+QUERY_CACHE_THRESHOLD = float(os.getenv('QUERY_CACHE_THRESHOLD', '0.95'))
+
+# Maximum number of cached answers; the least recently used one is evicted when full.
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+
+
+# Helper function: cosine_scores()
+# Dot product of the query with every cached row (rows and query are unit length, so this
+# is cosine similarity). The Numba version splits rows across threads and lets the compiler
+# vectorize the inner loop (AVX2/AVX-512 FMA), avoiding NumPy's per-call dispatch overhead
+# on these small matrix-vector products.
+
+if numba is not None:
+    @numba.njit(fastmath=True, cache=True, parallel=True)
+    def cosine_scores(E, q):
+        out = np.empty(E.shape[0], dtype=np.float32)
+        for i in numba.prange(E.shape[0]):
+            s = np.float32(0.0)
+            for j in range(E.shape[1]):
+                s += E[i, j] * q[j]
+            out[i] = s
+        return out
+else:
+    def cosine_scores(E, q):
+        return E @ q
+
+
+# Class: SemanticCache
+# Purpose:
+#   Remembers answers to previous questions, keyed by the question's embedding.
+#   A new question whose embedding is close enough to a cached one gets the cached answer
+#   without running retrieval or the LLM at all.
+#
+# Layout:
+#   - _embeddings: (capacity, dim) float32 matrix, one normalized query vector per row
+#   - _responses:  answer text for each row
+#   - _last_used:  "clock" value of each row's last hit, used for LRU eviction
+#   - _generation: bumped by every clear(); answers computed before a clear are rejected
+
+class SemanticCache:
+    def __init__(self, threshold=QUERY_CACHE_THRESHOLD, capacity=QUERY_CACHE_SIZE):
+        self.threshold = threshold
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.clear()
+
+    # Drop every cached answer (e.g., after new documents are embedded)
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._embeddings = None
+            self._responses = []
+            self._last_used = np.zeros(self.capacity, dtype=np.int64)
+            self._clock = 0
+
+    # Normalize a query embedding so a dot product equals cosine similarity
+    @staticmethod
+    def _normalize(embedding):
+        q = np.ascontiguousarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return q / norm if norm else q
+
+    # Return (cached answer or None on a miss, current generation).
+    # The generation must be passed back to add() with the answer computed on a miss.
+    def lookup(self, embedding):
+        q = self._normalize(embedding)
+
+        with self._lock:
+            size = len(self._responses)
+            if size == 0:
+                return None, self._generation
+
+            # One matrix-vector product scores the question against every cached one
+            scores = cosine_scores(self._embeddings[:size], q)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None, self._generation
+
+            self._clock += 1
+            self._last_used[best] = self._clock
+            return self._responses[best], self._generation
+
+    # Store the answer for a question.
+    # 'generation' is the value lookup() returned before the answer was computed. If the
+    # cache was cleared since then, the answer may come from the old documents and is dropped.
+    def add(self, embedding, response, generation):
+        q = self._normalize(embedding)
+
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            # Allocate the matrix on first use, once the embedding size is known
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.capacity, q.shape[0]), dtype=np.float32)
+
+            # Append while there is room, otherwise overwrite the least recently used row
+            if len(self._responses) < self.capacity:
+                slot = len(self._responses)
+                self._responses.append(response)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._responses[slot] = response
+
+            self._embeddings[slot] = q
+            self._clock += 1
+            self._last_used[slot] = self._clock
+
+
+# Shared cache used by query.py (and cleared by embed.py)
+QUERY_CACHE = SemanticCache()
+
+'''
+Notes:
+Semantic caching
+
+  - Users often ask the same question with slightly different wording.
+
+  - Comparing embeddings (not exact strings) lets those paraphrases share one answer.
+
+Cost of a cache hit
+
+  - One embedding of the question plus one matrix-vector product, instead of
+    several LLM calls and vector searches.
+
+Speed
+
+  - Embeddings are stored as one C-contiguous float32 matrix, so scoring is a tight loop
+    that Numba compiles to native SIMD code (NumPy is used if Numba isn't installed).
+
+Staleness
+
+  - Cached answers reflect the documents embedded at the time. embed.py clears the
+    cache whenever new documents are added.
+
+  - A query that was already running during a clear() can't re-insert its answer:
+    every clear() starts a new generation, and answers from an older one are dropped.
+'''